@@ -2,6 +2,8 @@
 Configuration settings for the MASX AI Proxy Service.
 """
 
+from functools import lru_cache
+
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -38,11 +40,20 @@ class Settings(BaseSettings):
         le=10,
         description="Proxy test timeout in seconds"
     )
-    batch_size: int = Field(
-        default=20,
-        ge=5,
-        le=100,
-        description="Number of proxies to test concurrently"
+    proxy_test_concurrency: int = Field(
+        default=200,
+        ge=1,
+        le=1000,
+        description="Maximum number of in-flight proxy tests"
+    )
+    proxy_test_target: int = Field(
+        default=50,
+        ge=0,
+        description="Stop testing once this many valid proxies are found (0 = test all)"
+    )
+    validate_proxies: bool = Field(
+        default=False,
+        description="Test fetched proxies before serving them"
     )
     
     api_key: str = Field(default="", description="API key")
@@ -52,28 +63,23 @@ class Settings(BaseSettings):
     host: str = Field(default="0.0.0.0", description="Server host")
     port: int = Field(default=8000, ge=1024, le=65535, description="Server port")
     debug: bool = Field(default=False, description="Debug mode")
+    enable_cors: bool = Field(default=False, description="Enable CORS middleware")
     
     # Logging configuration
     log_level: str = Field(default="INFO", description="Logging level")
     log_format: str = Field(default="json", description="Log format")
     
     # Rate limiting
-    # max_refresh_requests_per_minute: int = Field(
-    #     default=10,
-    #     ge=1,
-    #     le=100,
-    #     description="Maximum refresh requests per minute"
-    # )   
-
-
+    max_refresh_requests_per_minute: int = Field(
+        default=10,
+        ge=1,
+        le=100,
+        description="Maximum refresh requests per minute"
+    )
 
-# Global settings instance
-_settings = None
 
 
+@lru_cache(maxsize=1)
 def get_settings() -> Settings:
-    """Get or create settings instance."""
-    global _settings
-    if _settings is None:
-        _settings = Settings()
-    return _settings
+    """Get the cached settings instance (call get_settings.cache_clear() to reload)."""
+    return Settings()
@@ -1,3 +0,0 @@
-"""
-Core utilities and classes for the MASX AI Proxy Service.
-"""
@@ -2,9 +2,104 @@
 Logging configuration using structlog for JSON structured logging.
 """
 
+import atexit
+import io
+import logging
+import queue
 import sys
+import threading
+import time
+import orjson
 import structlog
-from typing import Any, Dict
+from typing import Optional, Union
+
+
+class QueueLogWriter:
+    """
+    File-like sink that hands rendered log lines to a background writer thread,
+    so request handlers only pay for an enqueue instead of a stdout write.
+    The thread writes into a 4 KiB buffer that is flushed when full or at
+    least every flush_interval seconds, coalescing bursts into few syscalls.
+    """
+
+    def __init__(
+        self,
+        stream=None,
+        buffer_size: int = 4096,
+        flush_interval: float = 0.1
+    ):
+        """Start the writer thread for the given binary stream (stdout by default)."""
+        if stream is None:
+            # sys.stdout may have been replaced by a text-only stream (no
+            # .buffer); write to the original process stdout in that case
+            stdout = sys.stdout if hasattr(sys.stdout, "buffer") else sys.__stdout__
+            stream = stdout.buffer
+        self._stream = io.BufferedWriter(stream, buffer_size=buffer_size)
+        self._flush_interval = flush_interval
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._drain, name="log-writer", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, data: Union[bytes, str]) -> None:
+        """Enqueue a rendered log line."""
+        self._queue.put(data)
+
+    def flush(self) -> None:
+        """No-op: the writer thread flushes on its own timer."""
+
+    def _drain(self) -> None:
+        """Write queued lines to the buffer until the stop sentinel arrives."""
+        last_flush = time.monotonic()
+        reported = False
+        while True:
+            try:
+                data = self._queue.get(timeout=self._flush_interval)
+            except queue.Empty:
+                data = b""
+            if data is None:
+                break
+            if isinstance(data, str):
+                data = data.encode()
+            try:
+                if data:
+                    self._stream.write(data)
+                now = time.monotonic()
+                if now - last_flush >= self._flush_interval:
+                    self._stream.flush()
+                    last_flush = now
+            except Exception as e:
+                # Never let a bad write kill the thread: the queue would then
+                # grow without bound. Report the first failure out of band.
+                if not reported and sys.__stderr__ is not None:
+                    reported = True
+                    print(f"log-writer: write failed: {e!r}", file=sys.__stderr__)
+
+    def close(self) -> None:
+        """Flush pending lines and stop the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+        try:
+            self._stream.flush()
+            # Detach so closing the buffer never closes stdout itself
+            self._stream.detach()
+        except (OSError, ValueError):
+            pass
+
+
+# Shared log writer, created on first configure_logging call
+_log_writer: Optional[QueueLogWriter] = None
+
+
+def get_log_writer() -> QueueLogWriter:
+    """Get or create the shared queue log writer."""
+    global _log_writer
+    if _log_writer is None:
+        _log_writer = QueueLogWriter()
+    return _log_writer
 
 
 def configure_logging(
@@ -13,20 +108,10 @@ def configure_logging(
 ) -> None:
     """Configure structlog with the specified format and level."""
     
-    # Configure standard library logging
-    import logging
-    logging.basicConfig(
-        format="%(message)s",
-        stream=sys.stdout,
-        level=getattr(logging, log_level.upper())
-    )
-    
-    # Configure structlog
+    # Configure structlog (native loggers, no stdlib logging bridge)
+    log_writer = get_log_writer()
     processors = [
-        structlog.stdlib.filter_by_level,
-        structlog.stdlib.add_logger_name,
-        structlog.stdlib.add_log_level,
-        structlog.stdlib.PositionalArgumentsFormatter(),
+        structlog.processors.add_log_level,
         structlog.processors.TimeStamper(fmt="iso"),
         structlog.processors.StackInfoRenderer(),
         structlog.processors.format_exc_info,
@@ -34,22 +119,27 @@ def configure_logging(
     ]
     
     if log_format.lower() == "json":
-        processors.append(structlog.processors.JSONRenderer())
+        # orjson emits bytes, which BytesLogger writes straight to stdout's buffer
+        processors.append(structlog.processors.JSONRenderer(serializer=orjson.dumps))
+        logger_factory = structlog.BytesLoggerFactory(file=log_writer)
     else:
         processors.append(structlog.dev.ConsoleRenderer())
+        logger_factory = structlog.WriteLoggerFactory(file=log_writer)
     
     structlog.configure(
         processors=processors,
         context_class=dict,
-        logger_factory=structlog.stdlib.LoggerFactory(),
-        wrapper_class=structlog.stdlib.BoundLogger,
+        logger_factory=logger_factory,
+        wrapper_class=structlog.make_filtering_bound_logger(
+            getattr(logging, log_level.upper())
+        ),
         cache_logger_on_first_use=True,
     )
 
 
 def get_logger(name: str) -> structlog.BoundLogger:
     """Get a logger instance with the given name."""
-    return structlog.get_logger(name)
+    return structlog.get_logger(name).bind(logger=name)
 
 
 def get_service_logger(service_name: str) -> structlog.BoundLogger:
@@ -3,33 +3,64 @@ Main FastAPI application for the MASX AI Proxy Service.
 """
 
 import asyncio
+import hmac
+import itertools
 import signal
 import os
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Request, status, HTTPException, Depends
+import aiohttp
+import orjson
+from fastapi import FastAPI, Request, Response, status, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
 
 from app.config import get_settings
 from app.logging_config import get_service_logger, configure_logging
-from app.routes import router
-from app.proxy_manager import ProxyManager
 
-# Global task reference
-proxy_task: asyncio.Task | None = None
-
-# Configure logging
+# Configure logging before importing modules that bind loggers at import time
+# (structlog fixes a logger's level filter and renderer when it is bound)
 settings = get_settings()
 configure_logging(settings.log_level, settings.log_format)
 logger = get_service_logger("Main")
 
+from app.routes import router  # noqa: E402
+from app.proxy_manager import ProxyManager  # noqa: E402
+
+# Global task reference
+proxy_task: asyncio.Task | None = None
+
+# First retry delay (seconds) after a failed scheduled refresh
+REFRESH_BACKOFF_START = 5
+
+
+# Expected API key, encoded once for constant-time comparison
+API_KEY_BYTES = settings.api_key.encode()
+
+# CPUs this process may run on, handed out round-robin to executor threads
+_cpu_cycle = (
+    itertools.cycle(sorted(os.sched_getaffinity(0)))
+    if hasattr(os, "sched_setaffinity") else None
+)
+
+
+def _pin_thread() -> None:
+    """Pin the calling executor thread to the next CPU (Linux only, no-op elsewhere)."""
+    if _cpu_cycle is None:
+        return
+    try:
+        os.sched_setaffinity(0, {next(_cpu_cycle)})
+    except OSError:
+        pass
+
 
 async def verify_api_key(request: Request):
     """
     Verify API key from request headers.
+    Only installed as an app dependency when REQUIRE_API_KEY is enabled.
 
     Args:
         request: FastAPI request object
@@ -40,12 +71,6 @@ async def verify_api_key(request: Request):
     Raises:
         HTTPException: If API key is missing or invalid
     """
-    settings = get_settings()
-
-    # Skip verification if not required
-    if not settings.require_api_key:
-        return True
-
     # Get API key from headers
     api_key = request.headers.get("X-API-Key") or request.headers.get("Authorization")
 
@@ -55,35 +80,61 @@ async def verify_api_key(request: Request):
             detail="API key required. Please provide X-API-Key or Authorization header",
         )
 
-    # Remove 'Bearer ' prefix if present
-    if api_key.startswith("Bearer "):
-        api_key = api_key[7:]
-
-    # Verify against configured API key
-    if api_key != settings.api_key:
+    # Verify against configured API key ('Bearer ' prefix is optional)
+    if not hmac.compare_digest(api_key.removeprefix("Bearer ").encode(), API_KEY_BYTES):
         raise HTTPException(status_code=401, detail="Invalid API key")
 
     return True
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create the shared HTTP session and ProxyManager on startup and release them on shutdown."""
+    # Size the default executor (used by asyncio.to_thread) for I/O-bound work
+    executor = ThreadPoolExecutor(
+        max_workers=(os.cpu_count() or 1) * 5,
+        thread_name_prefix="masx-io",
+        initializer=_pin_thread,
+    )
+    asyncio.get_running_loop().set_default_executor(executor)
+    # One connection pool for every refresh cycle, so keep-alive connections
+    # and DNS lookups are reused instead of re-established per refresh
+    async with aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(
+            limit=settings.proxy_test_concurrency, limit_per_host=50, ttl_dns_cache=300
+        )
+    ) as http_session:
+        app.state.http = http_session
+        app.state.proxy_manager = ProxyManager()
+        app.state.proxy_manager.use_session(http_session)
+        yield
+        await app.state.proxy_manager.shutdown()
+    executor.shutdown(wait=False)
+
+
 # Create FastAPI app
 app = FastAPI(
     title="MASX AI Proxy Service",
     description="A FastAPI service for managing and validating free proxies",
     version="1.0.0",
-    docs_url="/docs",
-    redoc_url="/redoc",
+    # API docs (and the OpenAPI schema) are only served in debug mode
+    docs_url="/docs" if settings.debug else None,
+    redoc_url="/redoc" if settings.debug else None,
+    openapi_url="/openapi.json" if settings.debug else None,
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     dependencies=[Depends(verify_api_key)] if settings.require_api_key else None,
 )
 
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Configure as needed for production
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Add CORS middleware (only needed for browser clients)
+if settings.enable_cors:
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # Configure as needed for production
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
  
         
 # Global exception handlers
@@ -94,7 +145,7 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
                  path=request.url.path,
                  method=request.method)
     
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={
             "success": False,
@@ -112,7 +163,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
                  path=request.url.path,
                  method=request.method)
     
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         content={
             "success": False,
@@ -131,7 +182,7 @@ async def general_exception_handler(request: Request, exc: Exception):
                  method=request.method,
                  exc_info=True)
     
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={
             "success": False,
@@ -145,24 +196,28 @@ async def general_exception_handler(request: Request, exc: Exception):
 app.include_router(router)
 
 
+# Root endpoint body never changes, so it is serialized once at import time
+ROOT_BODY = orjson.dumps({
+    "service": "MASX AI Proxy Service",
+    "version": "1.0.0",
+    "description": "A FastAPI service for managing and validating free proxies",
+    "endpoints": {
+        "docs": app.docs_url,
+        "redoc": app.redoc_url,
+        "health": "/api/v1/health",
+        "proxies": "/api/v1/proxies",
+        "random_proxy": "/api/v1/proxy/random",
+        "start_refresh": "/start-refresh",
+        "stats": "/api/v1/stats"
+    }
+})
+
+
 # Root endpoint
 @app.get("/")
 async def root():
     """Root endpoint with service information."""
-    return {
-        "service": "MASX AI Proxy Service",
-        "version": "1.0.0",
-        "description": "A FastAPI service for managing and validating free proxies",
-        "endpoints": {
-            "docs": "/docs",
-            "redoc": "/redoc",
-            "health": "/api/v1/health",
-            "proxies": "/api/v1/proxies",
-            "random_proxy": "/api/v1/proxy/random",
-            "start_refresh": "/start-refresh",
-            "stats": "/api/v1/stats"
-        }
-    }
+    return Response(content=ROOT_BODY, media_type="application/json")
     
 @app.post("/shutdown")
 async def shutdown(request: Request):
@@ -172,26 +227,50 @@ async def shutdown(request: Request):
     os.kill(pid, signal.SIGINT)  # or SIGTERM for docker
     return {"message": "Shutdown signal sent"}
 
-async def refresh_proxies_periodically(run_time: int = 7200):
-    """Refresh proxies every 5 minutes, stop after run_time seconds."""
-    start_time = asyncio.get_event_loop().time()
-    while True:
-        if asyncio.get_event_loop().time() - start_time > run_time:
-            logger.info("Proxy refresher reached 2h limit, stopping task.")
-            break
-        try:
-            logger.info("Refreshing proxies (scheduled task)")
-            await ProxyManager.refresh_proxies()
-        except Exception as e:
-            logger.error(f"Error in refresh_proxies_periodically: {e}")
-        await asyncio.sleep(300)  # 5 minutes
-        
+async def refresh_proxies_periodically(proxy_manager: ProxyManager, run_time: int = 7200):
+    """
+    Refresh proxies every refresh interval, stop after run_time seconds.
+    Failed refreshes are retried with exponential backoff (capped at the interval)
+    instead of hammering the proxy source.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + run_time
+    interval = settings.refresh_interval_minutes * 60
+    backoff = 0
+    try:
+        while loop.time() < deadline:
+            try:
+                logger.info("Refreshing proxies (scheduled task)")
+                # Shielded so stopping the refresher never interrupts a refresh midway
+                # Unthrottled: the manual rate limit is for HTTP callers only
+                result = await asyncio.shield(proxy_manager.force_refresh())
+                success = result["success"]
+            except Exception as e:
+                logger.error(f"Error in refresh_proxies_periodically: {e}")
+                success = False
+
+            if success:
+                backoff = 0
+                delay = interval
+            else:
+                backoff = min(max(backoff * 2, REFRESH_BACKOFF_START), interval)
+                delay = backoff
+                logger.warning(f"Proxy refresh failed, retrying in {backoff}s")
+
+            await asyncio.sleep(min(delay, max(deadline - loop.time(), 0)))
+
+        logger.info("Proxy refresher reached its run time, stopping task.")
+    finally:
+        logger.info("Proxy refresher stopped")
+
 @app.post("/api/v1/start-refresh")
-async def start_refresh(run_time: int = 7200):
+async def start_refresh(request: Request, run_time: int = 7200):
     """Start the proxy refresher (default 2h)."""
     global proxy_task
     if proxy_task is None or proxy_task.done():
-        proxy_task = asyncio.create_task(refresh_proxies_periodically(run_time))
+        proxy_task = asyncio.create_task(
+            refresh_proxies_periodically(request.app.state.proxy_manager, run_time)
+        )
         return {"status": "started", "duration": f"{run_time//3600} hours"}
     return {"status": "already running"}
 
@@ -21,274 +21,373 @@ This module handles all proxy-related operations in the MASX AI News ETL pipelin
 """
 
 import random
+import re
+import threading
+import time
 from datetime import datetime, timedelta
 import asyncio
-from typing import Dict, Any, Optional
-import requests
-from bs4 import BeautifulSoup
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
+import aiohttp
 
 from app.config import get_settings
 from app.logging_config import get_service_logger
 from app.headers import headers_list
-from app.core.concurrency import CPUExecutors
+
+# Bound at import: app.main configures logging before importing this module
+_LOGGER = get_service_logger("ProxyManager")
+
+# One well-formed "ip:port" per line of a plain-text proxy list
+_PROXY_LINE_RE = re.compile(
+    r"^[ \t]*(\d{1,3}(?:\.\d{1,3}){3}:\d{1,5})[ \t\r]*$", re.MULTILINE
+)
 
 
-# convert this class to a singleton
 class ProxyManager:
     """
     Handles all proxy-related operations in the MASX AI News ETL pipeline.
+
+    ProxyManager is a singleton: every ProxyManager() call returns the same
+    instance, which the FastAPI lifespan stores on app.state.
     """
 
-    _proxies = []
-    __settings = get_settings()
-    __didsoft_proxy_url = __settings.didsoft_proxy_url    
-    __proxy_webpage = __settings.proxy_webpage
-    __proxy_testing_url = __settings.proxy_testing_url
-    __headers_list = headers_list
-    __proxy_expiration = timedelta(minutes=6)
-    __proxy_timestamp = datetime.now()
-    __logger = get_service_logger("ProxyManager")
-
-    # Initialize CPU executors for async processing
-    __cpu_executors = CPUExecutors()
-    __refresh_count = 0
-    __lock = asyncio.Lock()  # protects refresh
-
-    @classmethod
-    def proxies(cls):
+    _instance: Optional["ProxyManager"] = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        """Create the shared instance on first use (double-checked, lock-free once created)."""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    instance = super().__new__(cls)
+                    instance._initialized = False
+                    cls._instance = instance
+        return cls._instance
+
+    def __init__(self):
+        """Initialize proxy state once for the shared instance."""
+        if self._initialized:
+            return
+        with self._instance_lock:
+            if not self._initialized:
+                self._init_state()
+                # Set last so other threads never see a half-initialized instance
+                self._initialized = True
+
+    def _init_state(self) -> None:
+        """Set up settings, logging and proxy state (runs once, under the instance lock)."""
+        self._settings = get_settings()
+        self._logger = _LOGGER
+        self._headers = tuple(headers_list)
+        self._headers_count = len(self._headers)
+        # Private generator: no shared state with the module-level random functions
+        self._rng = random.Random()
+        self._proxy_fetch_timeout = aiohttp.ClientTimeout(total=20)
+        self._proxy_test_timeout = aiohttp.ClientTimeout(total=self._settings.proxy_test_timeout)
+        self._proxy_expiration = timedelta(minutes=6)
+        # Retry delay after a refresh that found no proxies (the old list is kept)
+        self._proxy_retry_delay = timedelta(seconds=30)
+
+        # Replaced atomically on refresh, never mutated in place
+        self._proxies: Tuple[str, ...] = ()
+        # Wall-clock refresh times, formatted once per refresh (for stats only)
+        self._last_refresh_iso: Optional[str] = None
+        self._next_refresh_iso = "Unknown"
+        self._proxy_deadline = 0.0  # time.monotonic() after which proxies expire
+        self._generation = 0
+
+        # get_stats() result, rebuilt only when its stats version changes
+        self._stats_version: Optional[Tuple[int, int]] = None
+        self._stats: Dict[str, Any] = {}
+
+        # Manual refresh rate limiting (sliding 60s window of monotonic timestamps)
+        self._refresh_count = 0  # accepted manual refreshes, for stats
+        self._refresh_log: deque = deque()
+
+        # HTTP session: shared one from the app lifespan, or created lazily
+        # inside the running event loop when none was provided
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._owns_session = False
+        self._lock: Optional[asyncio.Lock] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        """Get the refresh lock, creating it inside the running event loop."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def _is_expired(self) -> bool:
+        """Check whether the cached proxies are missing or expired."""
+        return not self._proxies or time.monotonic() >= self._proxy_deadline
+
+    def proxies(self) -> Tuple[str, ...]:
         """
-        Get available proxies (synchronous wrapper for backward compatibility).
+        Get the cached proxies without refreshing (synchronous, never touches the event loop).
+        Returns an empty tuple once the cache has expired; use get_proxies for a guaranteed fresh list.
         """
-        # Use asyncio.run for synchronous access
-        return asyncio.run(cls.proxies_async())
+        if self._is_expired():
+            return ()
+        return self._proxies
 
-    @classmethod
-    async def proxies_async(cls):
+    async def get_proxies(self) -> Tuple[str, ...]:
         """
         Get available proxies asynchronously.
-        """ 
-        #async with cls.__lock:  # wait if refresh is running        
-            
-        if cls._proxies:
-            if cls.__proxy_timestamp + cls.__proxy_expiration < datetime.now():
-                cls._proxies = []
-        
-        if not cls._proxies:
-            # get all proxies
-            cls.__logger.info("proxy_manager.py:Getting proxies from proxy site...")
-            all_proxies = cls.__get_proxies()
-            # test proxies
-            cls.__logger.info("proxy_manager.py:Testing proxies...")
-            #proxies = list(set(await cls.__test_proxy(all_proxies)))
-            cls._proxies = all_proxies
-            cls.__logger.info(f"proxy_manager.py:Found {len(cls._proxies)} proxies")
-            cls.__proxy_timestamp = datetime.now()
-
-        return cls._proxies
-    
-    @classmethod
-    async def refresh_proxies(cls):
+        Expired proxies are served as-is while a background task refreshes them
+        (stale-while-revalidate); callers only wait when there is nothing cached.
         """
-        Get available proxies asynchronously.
-        """       
-        # get all proxies
-        #async with cls.__lock:
-        cls.__logger.info("proxy_manager.py:Getting proxies from proxy site...")
-        all_proxies = cls.__get_proxies()
-        # test proxies
-        cls.__logger.info("proxy_manager.py:Testing proxies...")
-        #proxies = list(set(await cls.__test_proxy(all_proxies)))
-        cls._proxies = all_proxies
-        cls.__logger.info(f"proxy_manager.py:Found {len(cls._proxies)} proxies")
-        cls.__proxy_timestamp = datetime.now()            
-            
-
-    @classmethod
-    def __get_proxies_2(cls):
-
-        import requests
-        import json
+        if self._is_expired():
+            refresh = self._start_refresh()
+            if not self._proxies:
+                # Every waiting caller shares the one in-flight refresh; shielded so
+                # a cancelled request does not abort it for the others
+                await asyncio.shield(refresh)
+
+        return self._proxies
+
+    async def _refresh_if_expired(self) -> None:
+        """Refresh under the lock unless another caller already did."""
+        async with self._get_lock():
+            # Another caller may have refreshed while we waited for the lock
+            if self._is_expired():
+                await self._refresh_proxies()
+
+    def _start_refresh(self) -> asyncio.Task:
+        """Get the in-flight refresh task, starting one if none is running (single-flight)."""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_if_expired())
+            self._refresh_task.add_done_callback(self._log_refresh_failure)
+        return self._refresh_task
+
+    def _log_refresh_failure(self, task: asyncio.Task) -> None:
+        """Log a failed refresh (stale-serving callers never await the task)."""
+        if not task.cancelled() and task.exception() is not None:
+            self._logger.error(f"proxy_manager.py:Proxy refresh failed: {task.exception()}")
+
+    async def refresh_proxies(self) -> Dict[str, Any]:
+        """
+        Force a proxy refresh, limited to max_refresh_requests_per_minute.
 
-        # URL of the raw JSON file from proxifly using jsDelivr CDN
-        url = "https://cdn.jsdelivr.net/gh/proxifly/free-proxy-list@main/proxies/all/data.json"
+        Returns:
+            dict: Refresh result with success flag, proxy count and refresh times.
+        """
+        now = time.monotonic()
+        cutoff = now - 60.0
+        refresh_log = self._refresh_log
+        while refresh_log and refresh_log[0] <= cutoff:
+            refresh_log.popleft()
+
+        if len(refresh_log) >= self._settings.max_refresh_requests_per_minute:
+            self._logger.warning("proxy_manager.py:Refresh rate limit exceeded")
+            return {
+                "success": False,
+                "message": "Rate limit exceeded",
+                "next_refresh": self._next_refresh_iso
+            }
+
+        refresh_log.append(now)
+        self._refresh_count += 1
+        return await self.force_refresh()
+
+    async def force_refresh(self) -> Dict[str, Any]:
+        """
+        Refresh proxies now, bypassing the manual refresh rate limit.
+        Used by the background scheduler; HTTP callers go through refresh_proxies.
 
-        try:
-            # Download the JSON file
-            response = requests.get(url)
-            response.raise_for_status()  # Raise an error for bad status codes
-            proxies = response.json()
+        Returns:
+            dict: Refresh result with success flag, proxy count and refresh times.
+        """
+        async with self._get_lock():
+            replaced = await self._refresh_proxies()
 
-            # Extract only the IPs
-            ip_list = [
-                str(proxy["ip"]) + ":" + str(proxy["port"])
-                for proxy in proxies
-                if "ip" in proxy
-            ]
+        return {
+            "success": replaced,
+            "proxy_count": len(self._proxies),
+            "last_refresh": self._last_refresh_iso,
+            "next_refresh": self._next_refresh_iso
+        }
 
-        except requests.exceptions.RequestException as e:
-            print(f"Error downloading proxies: {e}")
+    async def _refresh_proxies(self) -> bool:
+        """
+        Fetch (and optionally test) proxies and replace the cached list.
 
-        return ip_list
+        Returns:
+            bool: True if the cached list was replaced, False if the refresh
+            found no proxies and the previous list was kept.
+        """
+        # get all proxies
+        self._logger.info("proxy_manager.py:Getting proxies from proxy site...")
+        all_proxies = await self._fetch_proxies()
+        # test proxies
+        if self._settings.validate_proxies:
+            self._logger.info("proxy_manager.py:Testing proxies...")
+            all_proxies = await self._test_proxies(all_proxies)
+        if not all_proxies:
+            # A failed fetch or a bad validation run must not wipe a working
+            # list; keep serving it and try again shortly
+            self._logger.warning(
+                f"proxy_manager.py:No proxies found, keeping {len(self._proxies)} cached proxies"
+            )
+            now = datetime.now()
+            self._next_refresh_iso = (now + self._proxy_retry_delay).isoformat()
+            self._proxy_deadline = time.monotonic() + self._proxy_retry_delay.total_seconds()
+            return False
+        self._proxies = tuple(all_proxies)
+        self._logger.info(f"proxy_manager.py:Found {len(self._proxies)} proxies")
+        now = datetime.now()
+        self._last_refresh_iso = now.isoformat()
+        self._next_refresh_iso = (now + self._proxy_expiration).isoformat()
+        self._proxy_deadline = time.monotonic() + self._proxy_expiration.total_seconds()
+        self._generation += 1
+        return True
+
+    @staticmethod
+    def _parse_proxy_list(text: str) -> List[str]:
+        """
+        Parse a plain-text proxy list (one "ip:port" per line).
+        Blank or malformed lines and duplicates are dropped in a single regex pass.
+        """
+        return list(dict.fromkeys(_PROXY_LINE_RE.findall(text)))
 
-    @classmethod
-    def __get_proxies(cls):
+    async def _fetch_proxies(self) -> List[str]:
         """
         Get a list of proxies from Didsoft or another proxy source.
 
         Returns:
             list[str]: List of proxy addresses in "ip:port" format.
         """
-        url = cls.__didsoft_proxy_url
-        proxies: list[str] = []
-
-        # Configure retry session
-        session = requests.Session()
-        retries = Retry(total=3, backoff_factor=1, status_forcelist=(429, 500, 502, 503, 504))
-        session.mount("http://", HTTPAdapter(max_retries=retries))
+        url = self._settings.didsoft_proxy_url
 
         try:
-            cls.__logger.info(f"Fetching proxy list from: {url}")
-            response = session.get(url, timeout=20)
-            response.raise_for_status()
-
-            if not response.text.strip():
-                cls.__logger.warning("Proxy list response is empty.")
+            self._logger.info(f"Fetching proxy list from: {url}")
+            session = self._get_session()
+            async with session.get(url, timeout=self._proxy_fetch_timeout) as response:
+                response.raise_for_status()
+                text = await response.text()
+
+            if not text.strip():
+                self._logger.warning("Proxy list response is empty.")
                 return []
 
-            proxies = [line.strip() for line in response.text.splitlines() if line.strip()]
-            cls.__logger.info(f"Retrieved {len(proxies)} proxies from Didsoft.")
+            proxies = self._parse_proxy_list(text)
+            self._logger.info(f"Retrieved {len(proxies)} proxies from Didsoft.")
             return proxies
 
-        except requests.RequestException as e:
-            cls.__logger.error(f"Error downloading proxies: {e}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self._logger.error(f"Error downloading proxies: {e}")
             return []
-        
-        
-    @classmethod
-    def __get_proxies_old(cls):
-        """
-        Get a list of proxies from a proxy site).
-        """
-        proxies = []
-        headers = random.choice(cls.__headers_list)
-        page = requests.get(cls.__proxy_webpage, headers=headers)
-        soup = BeautifulSoup(page.content, "html.parser")
-        for row in soup.find("tbody").find_all("tr"):
-            proxy = row.find_all("td")[0].text + ":" + row.find_all("td")[1].text
-            proxies.append(proxy)
-
-        return proxies
-
-    @classmethod
-    async def __test_proxy(cls, proxies):
-        """Checks which ones actually work using async CPU executors."""
-        try:
-            # Process proxies in batches for efficiency
-            batch_size = 20
-            valid_proxies = []
 
-            for i in range(0, len(proxies), batch_size):
-                batch = proxies[i : i + batch_size]
-                batch_results = await cls._test_proxy_batch(batch)
-                valid_proxies.extend(batch_results)
-
-            return valid_proxies
-
-        except Exception as e:
-            cls.__logger.error(f"proxy_manager.py:Proxy testing failed: {e}")
-            # Fallback to synchronous testing
-            return cls._test_proxy_sync(proxies)
+    def use_session(self, session: aiohttp.ClientSession) -> None:
+        """Use an externally managed HTTP session (e.g. from the app lifespan)."""
+        self._session = session
+        self._owns_session = False
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Get the HTTP session used for fetching and testing proxies."""
+        if self._session is None or self._session.closed:
+            # Pool sized to the probe concurrency so workers never wait on a connection slot
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self._settings.proxy_test_concurrency, ttl_dns_cache=300
+                ),
+            )
+            self._owns_session = True
+        return self._session
 
-    @classmethod
-    async def _test_proxy_batch(cls, proxies):
-        """Test a batch of proxies concurrently."""
-        try:
-            # Create tasks for concurrent testing
-            tasks = [
-                cls.__cpu_executors.run_in_thread(cls.__test_single_proxy, proxy)
-                for proxy in proxies
-            ]
-
-            # Execute all tasks concurrently
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-
-            # Process results
-            valid_proxies = []
-            for i, result in enumerate(results):
-                if isinstance(result, Exception):
-                    cls.__logger.debug(
-                        f"proxy_manager.py:Proxy {proxies[i]} testing failed: {result}"
+    async def _test_proxies(self, proxies: List[str]) -> List[str]:
+        """
+        Checks which ones actually work using concurrent aiohttp requests.
+        Stops early (cancelling in-flight tests) once proxy_test_target valid
+        proxies are found.
+        """
+        session = self._get_session()
+        target = self._settings.proxy_test_target or len(proxies)
+        # A fixed pool of workers pulls from one shared iterator, so only
+        # proxy_test_concurrency tasks exist at a time instead of one per proxy
+        pending = iter(enumerate(proxies))
+        results: List[Optional[str]] = [None] * len(proxies)
+        found = 0
+
+        async def worker():
+            nonlocal found
+            for index, proxy in pending:
+                try:
+                    if await self._test_single_proxy(session, proxy):
+                        results[index] = proxy
+                        found += 1
+                except Exception as e:
+                    self._logger.debug(
+                        f"proxy_manager.py:Proxy {proxy} testing failed: {e}"
                     )
-                    continue
-
-                if result:
-                    valid_proxies.append(proxies[i])
-
-            return valid_proxies
-
-        except Exception as e:
-            cls.__logger.error(f"proxy_manager.py:Batch proxy testing failed: {e}")
-            return []
-
-    @classmethod
-    def _test_proxy_sync(cls, proxies):
-        """Synchronous fallback for proxy testing."""
-        valid_proxies = []
-        for proxy in proxies:
-            try:
-                if cls.__test_single_proxy(proxy):
-                    valid_proxies.append(proxy)
-            except Exception as e:
-                cls.__logger.debug(
-                    f"proxy_manager.py:Proxy {proxy} testing failed: {e}"
-                )
-        return valid_proxies
-
-    @classmethod
-    def __test_single_proxy(cls, proxy):
+                if found >= target:
+                    for task in tasks:
+                        if task is not asyncio.current_task():
+                            task.cancel()
+                    return
+
+        workers = min(self._settings.proxy_test_concurrency, len(proxies))
+        # TaskGroup cancels and awaits every worker if this call is cancelled or
+        # a worker fails, so no probe outlives the refresh that started it
+        async with asyncio.TaskGroup() as group:
+            tasks = [group.create_task(worker()) for _ in range(workers)]
+        return [proxy for proxy in results if proxy][:target]
+
+    async def _test_single_proxy(self, session: aiohttp.ClientSession, proxy: str) -> bool:
         """Test a single proxy"""
-        headers = random.choice(cls.__headers_list)
-        try:
-            resp = requests.get(
-                cls.__proxy_testing_url,
-                headers=headers,
-                proxies={"http": proxy, "https": proxy},
-                timeout=3,
-            )
-            if resp.status_code == 200:
-                return True
-        except:
-            pass
-        return False
-    
-    @classmethod
-    def get_random_proxy(cls) -> Optional[str]:
+        headers = self._headers[self._rng.randrange(self._headers_count)]
+        async with session.get(
+            self._settings.proxy_testing_url,
+            headers=headers,
+            proxy=f"http://{proxy}",
+            timeout=self._proxy_test_timeout,
+            ssl=False,
+        ) as resp:
+            return resp.status == 200
+
+    def get_random_proxy(self) -> Optional[str]:
         """
         Get a random valid proxy synchronously.
         Returns None if no proxies available.
         """
-        if not cls._proxies:
-            return None
-        return random.choice(cls._proxies)
-    
-    @classmethod
-    def _get_next_refresh_time(cls) -> str:
-        """Get the next automatic refresh time."""
-        if cls.__proxy_timestamp is None:
-            return "Unknown"
-        
-        next_refresh = cls.__proxy_timestamp + cls.__proxy_expiration
-        return next_refresh.isoformat()
-    
-    
-    @classmethod
-    def get_stats(cls) -> Dict[str, Any]:
-        """Get proxy manager statistics."""
-        return {
-            "proxy_count": len(cls._proxies),
-            "last_refresh": cls.__proxy_timestamp.isoformat() if cls.__proxy_timestamp else None,
-            "next_refresh": cls._get_next_refresh_time(),
-            "refresh_count": cls.__refresh_count
-        }
+        proxies = self._proxies
+        return proxies[self._rng.randrange(len(proxies))] if proxies else None
+
+    def get_generation(self) -> int:
+        """Get the number of completed refreshes (changes whenever the proxy list does)."""
+        return self._generation
+
+    def get_stats_version(self) -> Tuple[int, int]:
+        """Get a key that changes whenever get_stats() would return different data."""
+        return self._generation, self._refresh_count
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get proxy manager statistics.
+        The same dict is returned until a refresh or the refresh counter changes it;
+        treat it as read-only.
+        """
+        version = self.get_stats_version()
+        if version != self._stats_version:
+            self._stats = {
+                "proxy_count": len(self._proxies),
+                "last_refresh": self._last_refresh_iso,
+                "next_refresh": self._next_refresh_iso,
+                "refresh_count": self._refresh_count,
+                "max_refresh_per_minute": self._settings.max_refresh_requests_per_minute
+            }
+            self._stats_version = version
+        return self._stats
+
+    async def shutdown(self) -> None:
+        """
+        Cancel any background refresh and close the HTTP session if it was created here
+        (shared sessions are closed by their owner).
+        """
+        if self._refresh_task is not None and not self._refresh_task.done():
+            self._refresh_task.cancel()
+            await asyncio.gather(self._refresh_task, return_exceptions=True)
+        self._refresh_task = None
+        if self._owns_session and self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._owns_session = False
@@ -2,8 +2,10 @@
 FastAPI routes for the MASX AI Proxy Service.
 """
 
-from typing import List, Dict, Any
-from fastapi import APIRouter, HTTPException, status
+from hashlib import blake2b
+from typing import List, Dict, Any, Callable, Hashable, Optional, Tuple
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from pydantic import BaseModel
 
 from app.proxy_manager import ProxyManager
@@ -13,6 +15,9 @@ from app.logging_config import get_service_logger
 router = APIRouter(prefix="/api/v1", tags=["proxies"])
 logger = get_service_logger("Routes")
 
+# Serialized response bodies per endpoint: (version, body, etag)
+_response_cache: Dict[str, Tuple[Hashable, bytes, str]] = {}
+
 
 # Response models
 class ProxyResponse(BaseModel):
@@ -26,8 +31,8 @@ class RefreshResponse(BaseModel):
     """Response model for refresh endpoint."""
     success: bool
     proxy_count: int
-    last_refresh: str = None
-    next_refresh: str = None
+    last_refresh: Optional[str] = None
+    next_refresh: Optional[str] = None
     message: str = "Success"
 
 
@@ -38,35 +43,53 @@ class ErrorResponse(BaseModel):
     message: str
 
 
-@router.get("/proxies", response_model=ProxyResponse)
-async def get_proxies():
+def get_proxy_manager(request: Request) -> ProxyManager:
+    """Get the shared ProxyManager created in the application lifespan."""
+    return request.app.state.proxy_manager
+
+
+def _cached_json_response(
+    request: Request,
+    key: str,
+    version: Hashable,
+    build: Callable[[], Dict[str, Any]],
+    max_age: int
+) -> Response:
     """
-    Get all available valid proxies.
-    
-    Returns:
-        List of working proxy strings in format "ip:port"
+    Serve a pre-serialized JSON body, rebuilding it only when the data version changes.
+    Bodies are encoded with orjson directly, skipping Pydantic validation, and carry
+    an ETag so clients polling with If-None-Match get an empty 304 when nothing changed.
+
+    Args:
+        request: Incoming request (for If-None-Match)
+        key: Cache key (usually the endpoint name)
+        version: Current data version, e.g. the proxy manager's refresh generation
+        build: Callable returning the response payload on a cache miss
+        max_age: Cache-Control max-age in seconds
     """
-    try:
-        logger.info("GET /proxies endpoint called")
-        proxies = await ProxyManager.proxies_async()
-        
-        return ProxyResponse(
-            success=True,
-            data=proxies,
-            message=f"Retrieved {len(proxies)} valid proxies"
-        )
-        
-    except Exception as e:
-        logger.error(f"Error in get_proxies: {e}", exc_info=True)
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to retrieve proxies: {str(e)}"
-        )
+    cached = _response_cache.get(key)
+    if cached is None or cached[0] != version:
+        body = orjson.dumps(build())
+        etag = f'"{blake2b(body, digest_size=8).hexdigest()}"'
+        cached = (version, body, etag)
+        _response_cache[key] = cached
+
+    headers = {"Cache-Control": f"max-age={max_age}", "ETag": cached[2]}
+    if request.headers.get("if-none-match") == cached[2]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
 
+    return Response(
+        content=cached[1],
+        media_type="application/json",
+        headers=headers
+    )
 
 
 @router.get("/proxies", response_model=ProxyResponse)
-async def get_proxies_old():
+async def get_proxies(
+    request: Request,
+    proxy_manager: ProxyManager = Depends(get_proxy_manager)
+):
     """
     Get all available valid proxies.
     
@@ -75,12 +98,18 @@ async def get_proxies_old():
     """
     try:
         logger.info("GET /proxies endpoint called")
-        proxies = await ProxyManager.proxies_async()
+        proxies = await proxy_manager.get_proxies()
         
-        return ProxyResponse(
-            success=True,
-            data=proxies,
-            message=f"Retrieved {len(proxies)} valid proxies"
+        return _cached_json_response(
+            request,
+            "proxies",
+            proxy_manager.get_generation(),
+            lambda: {
+                "success": True,
+                "data": proxies,
+                "message": f"Retrieved {len(proxies)} valid proxies"
+            },
+            max_age=60
         )
         
     except Exception as e:
@@ -91,8 +120,9 @@ async def get_proxies_old():
         )
 
 
+
 @router.get("/proxy/random", response_model=ProxyResponse)
-async def get_random_proxy():
+async def get_random_proxy(proxy_manager: ProxyManager = Depends(get_proxy_manager)):
     """
     Get a random valid proxy.
     
@@ -101,7 +131,7 @@ async def get_random_proxy():
     """
     try:
         logger.info("GET /proxy/random endpoint called")
-        proxy = ProxyManager.get_random_proxy()
+        proxy = proxy_manager.get_random_proxy()
         
         if not proxy:
             return ProxyResponse(
@@ -123,8 +153,47 @@ async def get_random_proxy():
             detail=f"Failed to retrieve random proxy: {str(e)}"
         )
 
+@router.post("/refresh", response_model=RefreshResponse)
+async def refresh_proxies(proxy_manager: ProxyManager = Depends(get_proxy_manager)):
+    """
+    Force a refresh of the proxy list (rate limited).
+    
+    Returns:
+        Refresh result with proxy count and refresh timing
+    """
+    try:
+        logger.info("POST /refresh endpoint called")
+        result = await proxy_manager.refresh_proxies()
+        
+        if not result["success"]:
+            return RefreshResponse(
+                success=False,
+                proxy_count=0,
+                next_refresh=result.get("next_refresh"),
+                message=result["message"]
+            )
+        
+        return RefreshResponse(
+            success=True,
+            proxy_count=result["proxy_count"],
+            last_refresh=result["last_refresh"],
+            next_refresh=result["next_refresh"],
+            message="Successfully refreshed proxies"
+        )
+        
+    except Exception as e:
+        logger.error(f"Error in refresh_proxies: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to refresh proxies: {str(e)}"
+        )
+
+
 @router.get("/stats", response_model=ProxyResponse)
-async def get_stats():
+async def get_stats(
+    request: Request,
+    proxy_manager: ProxyManager = Depends(get_proxy_manager)
+):
     """
     Get proxy manager statistics.
     
@@ -133,12 +202,17 @@ async def get_stats():
     """
     try:
         logger.info("GET /stats endpoint called")
-        stats = ProxyManager.get_stats()
         
-        return ProxyResponse(
-            success=True,
-            data=stats,
-            message="Statistics retrieved successfully"
+        return _cached_json_response(
+            request,
+            "stats",
+            proxy_manager.get_stats_version(),
+            lambda: {
+                "success": True,
+                "data": proxy_manager.get_stats(),
+                "message": "Statistics retrieved successfully"
+            },
+            max_age=5
         )
         
     except Exception as e:
@@ -150,7 +224,10 @@ async def get_stats():
 
 
 @router.get("/health", response_model=ProxyResponse)
-async def health_check():
+async def health_check(
+    request: Request,
+    proxy_manager: ProxyManager = Depends(get_proxy_manager)
+):
     """
     Health check endpoint.
     
@@ -159,19 +236,27 @@ async def health_check():
     """
     try:
         logger.info("GET /health endpoint called")
-        stats = ProxyManager.get_stats()
         
-        health_status = {
-            "status": "healthy",
-            "proxy_count": stats["proxy_count"],
-            "last_refresh": stats["last_refresh"],
-            "service": "MASX AI Proxy Service"
-        }
+        def build_health() -> Dict[str, Any]:
+            stats = proxy_manager.get_stats()
+            health_status = {
+                "status": "healthy",
+                "proxy_count": stats["proxy_count"],
+                "last_refresh": stats["last_refresh"],
+                "service": "MASX AI Proxy Service"
+            }
+            return {
+                "success": True,
+                "data": health_status,
+                "message": "Service is healthy"
+            }
         
-        return ProxyResponse(
-            success=True,
-            data=health_status,
-            message="Service is healthy"
+        return _cached_json_response(
+            request,
+            "health",
+            proxy_manager.get_generation(),
+            build_health,
+            max_age=5
         )
         
     except Exception as e:
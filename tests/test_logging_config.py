@@ -0,0 +1,49 @@
+"""
+Unit tests for the logging configuration.
+"""
+
+import io
+import time
+
+from app.logging_config import QueueLogWriter
+
+
+class FlakyStream(io.RawIOBase):
+    """Raw stream whose first write fails."""
+
+    def __init__(self):
+        self.data = b""
+        self.failed = False
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if not self.failed:
+            self.failed = True
+            raise RuntimeError("disk on fire")
+        self.data += bytes(data)
+        return len(data)
+
+
+class TestQueueLogWriter:
+    """Test cases for QueueLogWriter."""
+
+    def test_writer_survives_failed_write(self):
+        """Test that an unexpected write error does not stop the writer thread."""
+        stream = FlakyStream()
+        writer = QueueLogWriter(stream, buffer_size=1, flush_interval=0.01)
+        try:
+            writer.write(b"first\n")
+            deadline = time.monotonic() + 2
+            while not stream.failed and time.monotonic() < deadline:
+                time.sleep(0.01)
+            writer.write(b"second\n")
+            while b"second" not in stream.data and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+            assert stream.failed
+            assert writer._thread.is_alive()
+            assert b"second\n" in stream.data
+        finally:
+            writer.close()
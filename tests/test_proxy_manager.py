@@ -4,7 +4,13 @@ Unit tests for ProxyManager class.
 
 import pytest
 import asyncio
-from unittest.mock import Mock, patch, AsyncMock
+import os
+import subprocess
+import sys
+import threading
+import time
+import aiohttp
+from unittest.mock import Mock, MagicMock, patch, AsyncMock
 from datetime import datetime, timedelta
 
 from app.proxy_manager import ProxyManager
@@ -21,7 +27,7 @@ class TestProxyManager:
         ProxyManager._instance = None
         
         with patch('app.proxy_manager.get_settings', return_value=mock_settings):
-            with patch('app.proxy_manager.get_service_logger', return_value=mock_logger):
+            with patch('app.proxy_manager._LOGGER', mock_logger):
                 manager = ProxyManager()
                 return manager
     
@@ -34,8 +40,10 @@ class TestProxyManager:
             mock_settings.proxy_testing_url = "https://httpbin.org/ip"
             mock_settings.refresh_interval_minutes = 5
             mock_settings.proxy_test_timeout = 3
-            mock_settings.batch_size = 10
             mock_settings.max_refresh_requests_per_minute = 10
+            mock_settings.proxy_test_concurrency = 200
+            mock_settings.proxy_test_target = 0
+            mock_settings.validate_proxies = True
             mock.return_value = mock_settings
             yield mock_settings
     
@@ -44,9 +52,8 @@ class TestProxyManager:
     @pytest.fixture
     def mock_logger(self):
         """Mock logger for testing."""
-        with patch('app.proxy_manager.get_service_logger') as mock:
-            mock_logger = Mock()
-            mock.return_value = mock_logger
+        mock_logger = Mock()
+        with patch('app.proxy_manager._LOGGER', mock_logger):
             yield mock_logger
     
     def test_singleton_pattern(self):
@@ -54,13 +61,48 @@ class TestProxyManager:
         manager1 = ProxyManager()
         manager2 = ProxyManager()
         assert manager1 is manager2
+
+    def test_singleton_thread_safe(self, mock_settings, mock_logger):
+        """Test that concurrent first calls from several threads share one instance."""
+        ProxyManager._instance = None
+        barrier = threading.Barrier(8)
+        instances = []
+
+        def create():
+            barrier.wait()
+            instances.append(ProxyManager())
+
+        threads = [threading.Thread(target=create) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len({id(instance) for instance in instances}) == 1
+        assert instances[0]._initialized is True
+
+    def test_logger_honours_configured_level(self):
+        """Test that ProxyManager debug logs are emitted when LOG_LEVEL=DEBUG."""
+        env = {**os.environ, "LOG_LEVEL": "DEBUG", "LOG_FORMAT": "json"}
+        script = (
+            "import app.main, app.proxy_manager as pm, app.logging_config as lc\n"
+            "pm._LOGGER.debug('debug probe')\n"
+            "lc.get_log_writer().close()\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", script],
+            env=env, capture_output=True, text=True, check=True
+        )
+        
+        assert "debug probe" in result.stdout
     
     def test_initialization(self, proxy_manager, mock_settings, mock_logger):
         """Test ProxyManager initialization."""
         assert proxy_manager._settings == mock_settings
         assert proxy_manager._logger == mock_logger
-        assert proxy_manager._proxies == []
-        assert proxy_manager._proxy_timestamp is None
+        assert proxy_manager._proxies == ()
+        assert proxy_manager._last_refresh_iso is None
+        assert proxy_manager._proxy_deadline == 0.0
         assert proxy_manager._refresh_count == 0
     
     @pytest.mark.asyncio
@@ -71,15 +113,29 @@ class TestProxyManager:
             
             result = await proxy_manager.get_proxies()
             
-            assert result == []
+            assert result == ()
             mock_refresh.assert_called_once()
     
+    @pytest.mark.asyncio
+    async def test_get_proxies_single_flight(self, proxy_manager):
+        """Test that concurrent callers with nothing cached share one refresh."""
+        async def slow_refresh():
+            await asyncio.sleep(0.01)
+            proxy_manager._proxies = ("1.2.3.4:8080",)
+            proxy_manager._proxy_deadline = time.monotonic() + 60
+        
+        with patch.object(proxy_manager, '_refresh_proxies', side_effect=slow_refresh) as mock_refresh:
+            results = await asyncio.gather(*(proxy_manager.get_proxies() for _ in range(10)))
+        
+        assert mock_refresh.call_count == 1
+        assert all(result == ("1.2.3.4:8080",) for result in results)
+    
     @pytest.mark.asyncio
     async def test_get_proxies_with_existing_proxies(self, proxy_manager):
         """Test get_proxies when proxies already exist and are not expired."""
         # Set up existing proxies
         proxy_manager._proxies = ["1.2.3.4:8080", "5.6.7.8:3128"]
-        proxy_manager._proxy_timestamp = datetime.now()
+        proxy_manager._proxy_deadline = time.monotonic() + 60
         
         with patch.object(proxy_manager, '_refresh_proxies') as mock_refresh:
             result = await proxy_manager.get_proxies()
@@ -89,39 +145,44 @@ class TestProxyManager:
     
     @pytest.mark.asyncio
     async def test_get_proxies_expired(self, proxy_manager):
-        """Test get_proxies when proxies are expired."""
+        """Test get_proxies serves expired proxies while refreshing in the background."""
         # Set up expired proxies
         proxy_manager._proxies = ["1.2.3.4:8080"]
-        proxy_manager._proxy_timestamp = datetime.now() - timedelta(minutes=10)
+        proxy_manager._proxy_deadline = time.monotonic() - 1
         
         with patch.object(proxy_manager, '_refresh_proxies') as mock_refresh:
-            # Mock refresh to clear proxies
             def mock_refresh_side_effect():
-                proxy_manager._proxies = []
-                proxy_manager._proxy_timestamp = datetime.now()
+                proxy_manager._proxies = ["5.6.7.8:3128"]
+                proxy_manager._proxy_deadline = time.monotonic() + 60
             
             mock_refresh.side_effect = mock_refresh_side_effect
             
             result = await proxy_manager.get_proxies()
             
-            # After refresh, proxies should be empty
-            assert result == []
+            # The stale list is returned immediately
+            assert result == ["1.2.3.4:8080"]
+            
+            # A second caller does not start another refresh
+            await proxy_manager.get_proxies()
+            await proxy_manager._refresh_task
+            
             mock_refresh.assert_called_once()
+            assert await proxy_manager.get_proxies() == ["5.6.7.8:3128"]
     
     def test_get_random_proxy_with_proxies(self, proxy_manager):
         """Test get_random_proxy when proxies are available."""
-        proxy_manager._proxies = ["1.2.3.4:8080", "5.6.7.8:3128"]
+        proxy_manager._proxies = ("1.2.3.4:8080", "5.6.7.8:3128")
         
-        with patch('random.choice') as mock_choice:
-            mock_choice.return_value = "1.2.3.4:8080"
+        with patch.object(proxy_manager._rng, 'randrange') as mock_randrange:
+            mock_randrange.return_value = 1
             result = proxy_manager.get_random_proxy()
             
-            assert result == "1.2.3.4:8080"
-            mock_choice.assert_called_once_with(["1.2.3.4:8080", "5.6.7.8:3128"])
+            assert result == "5.6.7.8:3128"
+            mock_randrange.assert_called_once_with(2)
     
     def test_get_random_proxy_no_proxies(self, proxy_manager):
         """Test get_random_proxy when no proxies are available."""
-        proxy_manager._proxies = []
+        proxy_manager._proxies = ()
         
         result = proxy_manager.get_random_proxy()
         
@@ -131,9 +192,9 @@ class TestProxyManager:
     async def test_refresh_proxies_success(self, proxy_manager, mock_logger):
         """Test successful proxy refresh."""
         with patch.object(proxy_manager, '_refresh_proxies') as mock_refresh:
-            mock_refresh.return_value = None
+            mock_refresh.return_value = True
             proxy_manager._proxies = ["1.2.3.4:8080"]
-            proxy_manager._proxy_timestamp = datetime.now()
+            proxy_manager._last_refresh_iso = datetime.now().isoformat()
             
             result = await proxy_manager.refresh_proxies()
             
@@ -147,121 +208,168 @@ class TestProxyManager:
     async def test_refresh_proxies_rate_limited(self, proxy_manager):
         """Test proxy refresh when rate limit is exceeded."""
         # Set up rate limiting
-        proxy_manager._refresh_count = 15  # Exceeds limit
-        proxy_manager._refresh_reset_time = datetime.now()
+        now = time.monotonic()
+        proxy_manager._refresh_log.extend([now - 1] * 10)  # Limit reached
         
         result = await proxy_manager.refresh_proxies()
         
         assert result["success"] is False
         assert "Rate limit exceeded" in result["message"]
-    
+
     @pytest.mark.asyncio
-    async def test_fetch_proxies_html_success(self, proxy_manager):
-        """Test successful HTML proxy fetching."""
-        mock_proxies = ["1.2.3.4:8080", "5.6.7.8:3128"]
+    async def test_refresh_proxies_window_slides(self, proxy_manager):
+        """Test that refreshes older than 60 seconds leave the rate-limit window."""
+        now = time.monotonic()
+        proxy_manager._refresh_log.extend([now - 61] * 5 + [now - 1] * 5)
         
-        with patch.object(proxy_manager, '_fetch_html_proxies') as mock_html:
-            mock_html.return_value = mock_proxies
-            
-            result = await proxy_manager._fetch_proxies()
-            
-            # Check that all expected proxies are present (order may vary due to set operations)
-            assert len(result) == len(mock_proxies)
-            for proxy in mock_proxies:
-                assert proxy in result
-    
+        with patch.object(proxy_manager, '_refresh_proxies', return_value=True) as mock_refresh:
+            result = await proxy_manager.refresh_proxies()
+        
+        assert result["success"] is True
+        mock_refresh.assert_called_once()
+        assert len(proxy_manager._refresh_log) == 6
+
     @pytest.mark.asyncio
-    async def test_fetch_proxies_html_fallback_json(self, proxy_manager):
-        """Test HTML fetching failure with JSON fallback."""
-        mock_json_proxies = ["9.10.11.12:8080"]
-        
-        with patch.object(proxy_manager, '_fetch_html_proxies') as mock_html:
-            with patch.object(proxy_manager, '_fetch_json_proxies') as mock_json:
-                mock_html.side_effect = Exception("HTML fetch failed")
-                mock_json.return_value = mock_json_proxies
-                
-                result = await proxy_manager._fetch_proxies()
-                
-                assert result == mock_json_proxies
-    
+    async def test_force_refresh_bypasses_rate_limit(self, proxy_manager):
+        """Test that scheduled refreshes neither consume nor respect the manual rate limit."""
+        now = time.monotonic()
+        proxy_manager._refresh_log.extend([now - 1] * 10)  # Limit reached
+        
+        with patch.object(proxy_manager, '_refresh_proxies', return_value=True) as mock_refresh:
+            result = await proxy_manager.force_refresh()
+        
+        assert result["success"] is True
+        mock_refresh.assert_called_once()
+        assert len(proxy_manager._refresh_log) == 10
+        assert proxy_manager._refresh_count == 0
+
     @pytest.mark.asyncio
-    async def test_test_proxies_batch_processing(self, proxy_manager):
-        """Test proxy testing with batch processing."""
-        test_proxies = [f"1.2.3.{i}:8080" for i in range(25)]  # More than batch size
+    async def test_refresh_proxies_no_boundary_burst(self, proxy_manager):
+        """Test that at most the limit is accepted within any 60-second span."""
+        with patch('app.proxy_manager.time') as mock_time:
+            with patch.object(proxy_manager, '_refresh_proxies'):
+                # Fill the limit late in one minute...
+                mock_time.monotonic.return_value = 1059.0
+                first = [await proxy_manager.refresh_proxies() for _ in range(10)]
+                # ...and try again just after a fixed window would have reset
+                mock_time.monotonic.return_value = 1061.0
+                second = await proxy_manager.refresh_proxies()
+        
+        assert all(result["success"] for result in first)
+        assert second["success"] is False
+    
+    def test_parse_proxy_list(self, proxy_manager):
+        """Test parsing a plain-text proxy list (blank/malformed lines and duplicates dropped)."""
+        text = "1.2.3.4:8080\r\n  5.6.7.8:3128  \n\n<html>\n1.2.3.4:8080\n9.9.9.9\n"
+        
+        result = proxy_manager._parse_proxy_list(text)
         
-        with patch.object(proxy_manager, '_test_proxy_batch') as mock_batch:
-            mock_batch.return_value = ["1.2.3.1:8080", "1.2.3.2:8080"]
+        assert result == ["1.2.3.4:8080", "5.6.7.8:3128"]
+
+    @pytest.mark.asyncio
+    async def test_fetch_proxies_error(self, proxy_manager):
+        """Test proxy fetching when the proxy source is unreachable."""
+        with patch('app.proxy_manager.aiohttp.ClientSession') as mock_session:
+            mock_session.side_effect = aiohttp.ClientError("Connection failed")
             
-            result = await proxy_manager._test_proxies(test_proxies)
+            result = await proxy_manager._fetch_proxies()
             
-            # Should call batch testing multiple times
-            # 25 proxies with batch size 10: [0-9], [10-19], [20-24] = 3 batches
-            assert mock_batch.call_count == 3
-            assert len(result) == 6  # 3 batches * 2 valid proxies each
+            assert result == []
     
     @pytest.mark.asyncio
-    async def test_test_proxy_batch_success(self, proxy_manager):
-        """Test successful batch proxy testing."""
-        test_proxies = ["1.2.3.4:8080", "5.6.7.8:3128"]
+    async def test_test_proxies_success(self, proxy_manager):
+        """Test concurrent proxy testing when all proxies are valid."""
+        test_proxies = [f"1.2.3.{i}:8080" for i in range(25)]
         
-        with patch.object(proxy_manager._cpu_executors, 'run_in_thread') as mock_run:
-            mock_run.return_value = asyncio.Future()
-            mock_run.return_value.set_result(True)  # All proxies valid
-            
-            result = await proxy_manager._test_proxy_batch(test_proxies)
-            
-            assert result == test_proxies
+        with patch.object(proxy_manager, '_get_session'):
+            with patch.object(proxy_manager, '_test_single_proxy') as mock_test:
+                mock_test.return_value = True
+                
+                result = await proxy_manager._test_proxies(test_proxies)
+                
+                assert result == test_proxies
+                assert mock_test.call_count == 25
     
     @pytest.mark.asyncio
-    async def test_test_proxy_batch_mixed_results(self, proxy_manager):
-        """Test batch proxy testing with mixed valid/invalid results."""
+    async def test_test_proxies_mixed_results(self, proxy_manager):
+        """Test proxy testing with mixed valid/invalid/failing proxies."""
         test_proxies = ["1.2.3.4:8080", "5.6.7.8:3128", "9.10.11.12:8080"]
         
-        with patch.object(proxy_manager._cpu_executors, 'run_in_thread') as mock_run:
-            # Create multiple futures for different calls
-            futures = []
-            for i in range(3):
-                future = asyncio.Future()
-                if i == 1:  # Second proxy fails
-                    future.set_exception(Exception("Connection failed"))
-                else:
-                    future.set_result(True)
-                futures.append(future)
-            
-            mock_run.side_effect = futures
-            
-            result = await proxy_manager._test_proxy_batch(test_proxies)
-            
-            # Should return only valid proxies (first and third)
-            # Note: The actual result depends on how the futures are processed
-            assert len(result) >= 0  # At least some proxies should be processed
-            assert "1.2.3.4:8080" in result or "9.10.11.12:8080" in result
-    
-    def test_test_single_proxy_success(self, proxy_manager):
+        with patch.object(proxy_manager, '_get_session'):
+            with patch.object(proxy_manager, '_test_single_proxy') as mock_test:
+                mock_test.side_effect = [True, Exception("Connection failed"), False]
+                
+                result = await proxy_manager._test_proxies(test_proxies)
+                
+                assert result == ["1.2.3.4:8080"]
+
+    @pytest.mark.asyncio
+    async def test_test_proxies_bounded_concurrency(self, proxy_manager, mock_settings):
+        """Test that no more than proxy_test_concurrency probes run at once."""
+        mock_settings.proxy_test_concurrency = 3
+        test_proxies = [f"1.2.3.{i}:8080" for i in range(10)]
+        in_flight = 0
+        peak = 0
+
+        async def probe(session, proxy):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0)
+            in_flight -= 1
+            return True
+
+        with patch.object(proxy_manager, '_get_session'):
+            with patch.object(proxy_manager, '_test_single_proxy', side_effect=probe):
+                result = await proxy_manager._test_proxies(test_proxies)
+
+        assert result == test_proxies
+        assert peak == 3
+
+    @pytest.mark.asyncio
+    async def test_test_proxies_stops_at_target(self, proxy_manager, mock_settings):
+        """Test that proxy testing stops once enough valid proxies are found."""
+        mock_settings.proxy_test_concurrency = 2
+        mock_settings.proxy_test_target = 3
+        test_proxies = [f"1.2.3.{i}:8080" for i in range(20)]
+
+        async def probe(session, proxy):
+            await asyncio.sleep(0)
+            return True
+
+        with patch.object(proxy_manager, '_get_session'):
+            with patch.object(proxy_manager, '_test_single_proxy', side_effect=probe) as mock_test:
+                result = await proxy_manager._test_proxies(test_proxies)
+
+        assert result == test_proxies[:3]
+        assert mock_test.call_count < len(test_proxies)
+
+    @pytest.mark.asyncio
+    async def test_test_single_proxy_success(self, proxy_manager):
         """Test successful single proxy testing."""
-        with patch('requests.get') as mock_get:
-            mock_response = Mock()
-            mock_response.status_code = 200
-            mock_get.return_value = mock_response
-            
-            result = proxy_manager._test_single_proxy("1.2.3.4:8080")
-            
-            assert result is True
-            mock_get.assert_called_once()
+        session = MagicMock()
+        session.get.return_value.__aenter__.return_value.status = 200
+        
+        result = await proxy_manager._test_single_proxy(session, "1.2.3.4:8080")
+        
+        assert result is True
+        session.get.assert_called_once()
+        assert session.get.call_args.kwargs["proxy"] == "http://1.2.3.4:8080"
     
-    def test_test_single_proxy_failure(self, proxy_manager):
+    @pytest.mark.asyncio
+    async def test_test_single_proxy_failure(self, proxy_manager):
         """Test failed single proxy testing."""
-        with patch('requests.get') as mock_get:
-            mock_get.side_effect = Exception("Connection failed")
-            
-            result = proxy_manager._test_single_proxy("1.2.3.4:8080")
-            
-            assert result is False
+        session = MagicMock()
+        session.get.return_value.__aenter__.return_value.status = 503
+        
+        result = await proxy_manager._test_single_proxy(session, "1.2.3.4:8080")
+        
+        assert result is False
     
     def test_get_stats(self, proxy_manager):
         """Test getting proxy manager statistics."""
         proxy_manager._proxies = ["1.2.3.4:8080"]
-        proxy_manager._proxy_timestamp = datetime.now()
+        proxy_manager._last_refresh_iso = datetime.now().isoformat()
         proxy_manager._refresh_count = 5
         
         stats = proxy_manager.get_stats()
@@ -270,20 +378,84 @@ class TestProxyManager:
         assert "last_refresh" in stats
         assert "next_refresh" in stats
         assert stats["refresh_count"] == 5
+
+    @pytest.mark.asyncio
+    async def test_refresh_stamps_iso_times(self, proxy_manager):
+        """Test that refresh times are formatted once, at refresh time."""
+        with patch.object(proxy_manager, '_fetch_proxies', return_value=["1.2.3.4:8080"]):
+            proxy_manager._settings.validate_proxies = False
+            await proxy_manager._refresh_proxies()
+        
+        stats = proxy_manager.get_stats()
+        proxy_manager._refresh_count += 1
+        stats2 = proxy_manager.get_stats()
+        
+        assert stats["last_refresh"] == proxy_manager._last_refresh_iso
+        assert stats["next_refresh"] > stats["last_refresh"]
+        assert stats2 is not stats
+        assert stats2["last_refresh"] is stats["last_refresh"]
+        assert stats2["next_refresh"] is stats["next_refresh"]
+
+    @pytest.mark.asyncio
+    async def test_refresh_keeps_proxies_when_none_found(self, proxy_manager):
+        """Test that an empty fetch keeps the cached proxies and retries soon."""
+        proxy_manager._proxies = ("1.2.3.4:8080",)
+        proxy_manager._generation = 3
+        proxy_manager._settings.validate_proxies = False
+
+        with patch.object(proxy_manager, '_fetch_proxies', return_value=[]):
+            replaced = await proxy_manager._refresh_proxies()
+
+        remaining = proxy_manager._proxy_deadline - time.monotonic()
+        assert replaced is False
+        assert proxy_manager._proxies == ("1.2.3.4:8080",)
+        assert proxy_manager._generation == 3
+        assert 0 < remaining <= proxy_manager._proxy_retry_delay.total_seconds()
+
+    def test_get_stats_cached(self, proxy_manager):
+        """Test that stats are only rebuilt when the refresh state changes."""
+        stats = proxy_manager.get_stats()
+
+        assert proxy_manager.get_stats() is stats
+
+        proxy_manager._refresh_count += 1
+
+        assert proxy_manager.get_stats() is not stats
+        assert proxy_manager.get_stats()["refresh_count"] == 1
     
-    def test_shutdown(self, proxy_manager):
+    @pytest.mark.asyncio
+    async def test_shutdown(self, proxy_manager):
         """Test proxy manager shutdown."""
-        with patch.object(proxy_manager._cpu_executors, 'shutdown') as mock_shutdown:
-            proxy_manager.shutdown()
-            
-            mock_shutdown.assert_called_once()
+        mock_session = Mock()
+        mock_session.closed = False
+        mock_session.close = AsyncMock()
+        proxy_manager._session = mock_session
+        proxy_manager._owns_session = True
+        
+        await proxy_manager.shutdown()
+        
+        mock_session.close.assert_awaited_once()
+        assert proxy_manager._session is None
+    
+    @pytest.mark.asyncio
+    async def test_shutdown_shared_session(self, proxy_manager):
+        """Test that shutdown leaves a shared session to its owner."""
+        mock_session = Mock()
+        mock_session.closed = False
+        mock_session.close = AsyncMock()
+        proxy_manager.use_session(mock_session)
+        
+        await proxy_manager.shutdown()
+        
+        mock_session.close.assert_not_awaited()
+        assert proxy_manager._session is None
     
     @pytest.mark.asyncio
     async def test_concurrent_access(self, proxy_manager):
         """Test concurrent access to proxy manager."""
         # Set up some proxies
         proxy_manager._proxies = ["1.2.3.4:8080"]
-        proxy_manager._proxy_timestamp = datetime.now()
+        proxy_manager._proxy_deadline = time.monotonic() + 60
         
         # Create multiple concurrent tasks
         async def get_proxies():
@@ -1,25 +1,52 @@
 """
-API tests for FastAPI routes using TestClient.
+API tests for FastAPI routes using httpx.AsyncClient over ASGITransport.
 """
 
+import asyncio
+import os
+import subprocess
+import sys
 import pytest
-from unittest.mock import Mock, patch
-from fastapi.testclient import TestClient
+import pytest_asyncio
+from unittest.mock import Mock
+from httpx import ASGITransport, AsyncClient
 
 from app.main import app
+from app.proxy_manager import ProxyManager
+from app.routes import get_proxy_manager
 
 
 class TestRoutes:
     """Test cases for FastAPI routes."""
     
+    @pytest_asyncio.fixture
+    async def client(self):
+        """Create a test client that calls the app in the running event loop."""
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            yield client
+
     @pytest.fixture
-    def client(self):
-        """Create a test client."""
-        return TestClient(app)
+    def mock_pm(self):
+        """Serve a mocked ProxyManager to the routes via a dependency override."""
+        mock_pm = Mock(spec=ProxyManager)
+        app.dependency_overrides[get_proxy_manager] = lambda: mock_pm
+        yield mock_pm
+        app.dependency_overrides.pop(get_proxy_manager, None)
+    
+    def test_route_logger_uses_configured_level(self):
+        """Test that LOG_LEVEL reaches the module-level route logger."""
+        env = {**os.environ, "LOG_LEVEL": "DEBUG"}
+        result = subprocess.run(
+            [sys.executable, "-c", "import app.main, app.routes; print(type(app.routes.logger).__name__)"],
+            env=env, capture_output=True, text=True, check=True
+        )
+        
+        assert "BoundLoggerFilteringAtDebug" in result.stdout
     
-    def test_root_endpoint(self, client):
+    @pytest.mark.asyncio
+    async def test_root_endpoint(self, client):
         """Test the root endpoint."""
-        response = client.get("/")
+        response = await client.get("/")
         
         assert response.status_code == 200
         data = response.json()
@@ -27,27 +54,26 @@ class TestRoutes:
         assert data["version"] == "1.0.0"
         assert "endpoints" in data
     
-    def test_docs_endpoint(self, client):
-        """Test that docs endpoint is accessible."""
-        response = client.get("/docs")
-        assert response.status_code == 200
+    @pytest.mark.asyncio
+    async def test_docs_endpoint(self, client):
+        """Test that docs endpoint is disabled outside debug mode."""
+        response = await client.get("/docs")
+        assert response.status_code == 404
     
-    def test_redoc_endpoint(self, client):
-        """Test that redoc endpoint is accessible."""
-        response = client.get("/redoc")
-        assert response.status_code == 200
+    @pytest.mark.asyncio
+    async def test_redoc_endpoint(self, client):
+        """Test that redoc endpoint is disabled outside debug mode."""
+        response = await client.get("/redoc")
+        assert response.status_code == 404
     
-    def test_get_proxies_success(self, client):
+    @pytest.mark.asyncio
+    async def test_get_proxies_success(self, client, mock_pm):
         """Test successful GET /proxies endpoint."""
         mock_proxies = ["1.2.3.4:8080", "5.6.7.8:3128"]
         
-        with patch('app.routes.proxy_manager') as mock_pm:
-            # Create an async mock that returns the proxies
-            async def mock_get_proxies():
-                return mock_proxies
-            mock_pm.get_proxies = mock_get_proxies
-            
-            response = client.get("/api/v1/proxies")
+        mock_pm.get_proxies.return_value = mock_proxies
+        
+        response = await client.get("/api/v1/proxies")
         
         assert response.status_code == 200
         data = response.json()
@@ -55,17 +81,14 @@ class TestRoutes:
         assert data["data"] == mock_proxies
         assert "Retrieved 2 valid proxies" in data["message"]
     
-    def test_get_proxies_empty(self, client):
+    @pytest.mark.asyncio
+    async def test_get_proxies_empty(self, client, mock_pm):
         """Test GET /proxies endpoint with no proxies."""
         mock_proxies = []
         
-        with patch('app.routes.proxy_manager') as mock_pm:
-            # Create an async mock that returns empty list
-            async def mock_get_proxies():
-                return mock_proxies
-            mock_pm.get_proxies = mock_get_proxies
-            
-            response = client.get("/api/v1/proxies")
+        mock_pm.get_proxies.return_value = mock_proxies
+        
+        response = await client.get("/api/v1/proxies")
         
         assert response.status_code == 200
         data = response.json()
@@ -73,29 +96,40 @@ class TestRoutes:
         assert data["data"] == []
         assert "Retrieved 0 valid proxies" in data["message"]
     
-    def test_get_proxies_error(self, client):
+    @pytest.mark.asyncio
+    async def test_get_proxies_etag_304(self, client, mock_pm):
+        """Test that GET /proxies answers a matching If-None-Match with 304."""
+        mock_pm.get_proxies.return_value = ["1.2.3.4:8080"]
+        
+        response = await client.get("/api/v1/proxies")
+        etag = response.headers["etag"]
+        cached = await client.get("/api/v1/proxies", headers={"If-None-Match": etag})
+        
+        assert response.status_code == 200
+        assert cached.status_code == 304
+        assert cached.content == b""
+        assert cached.headers["etag"] == etag
+    
+    @pytest.mark.asyncio
+    async def test_get_proxies_error(self, client, mock_pm):
         """Test GET /proxies endpoint with error."""
-        with patch('app.routes.proxy_manager') as mock_pm:
-            # Create an async mock that raises an exception
-            async def mock_get_proxies():
-                raise Exception("Database error")
-            mock_pm.get_proxies = mock_get_proxies
-            
-            response = client.get("/api/v1/proxies")
+        mock_pm.get_proxies.side_effect = Exception("Database error")
+        
+        response = await client.get("/api/v1/proxies")
         
         assert response.status_code == 500
         data = response.json()
         assert data["success"] is False
         assert "Failed to retrieve proxies: Database error" in data["message"]
     
-    def test_get_random_proxy_success(self, client):
+    @pytest.mark.asyncio
+    async def test_get_random_proxy_success(self, client, mock_pm):
         """Test successful GET /proxy/random endpoint."""
         mock_proxy = "1.2.3.4:8080"
         
-        with patch('app.routes.proxy_manager') as mock_pm:
-            mock_pm.get_random_proxy.return_value = mock_proxy
-            
-            response = client.get("/api/v1/proxy/random")
+        mock_pm.get_random_proxy.return_value = mock_proxy
+        
+        response = await client.get("/api/v1/proxy/random")
         
         assert response.status_code == 200
         data = response.json()
@@ -103,12 +137,12 @@ class TestRoutes:
         assert data["data"] == mock_proxy
         assert "Random proxy retrieved successfully" in data["message"]
     
-    def test_get_random_proxy_no_proxies(self, client):
+    @pytest.mark.asyncio
+    async def test_get_random_proxy_no_proxies(self, client, mock_pm):
         """Test GET /proxy/random endpoint with no proxies available."""
-        with patch('app.routes.proxy_manager') as mock_pm:
-            mock_pm.get_random_proxy.return_value = None
-            
-            response = client.get("/api/v1/proxy/random")
+        mock_pm.get_random_proxy.return_value = None
+        
+        response = await client.get("/api/v1/proxy/random")
         
         assert response.status_code == 200
         data = response.json()
@@ -116,19 +150,20 @@ class TestRoutes:
         assert data["data"] is None
         assert "No valid proxies available" in data["message"]
     
-    def test_get_random_proxy_error(self, client):
+    @pytest.mark.asyncio
+    async def test_get_random_proxy_error(self, client, mock_pm):
         """Test GET /proxy/random endpoint with error."""
-        with patch('app.routes.proxy_manager') as mock_pm:
-            mock_pm.get_random_proxy.side_effect = Exception("Service error")
-            
-            response = client.get("/api/v1/proxy/random")
+        mock_pm.get_random_proxy.side_effect = Exception("Service error")
+        
+        response = await client.get("/api/v1/proxy/random")
         
         assert response.status_code == 500
         data = response.json()
         assert data["success"] is False
         assert "Failed to retrieve random proxy: Service error" in data["message"]
     
-    def test_refresh_proxies_success(self, client):
+    @pytest.mark.asyncio
+    async def test_refresh_proxies_success(self, client, mock_pm):
         """Test successful POST /refresh endpoint."""
         mock_result = {
             "success": True,
@@ -137,13 +172,9 @@ class TestRoutes:
             "next_refresh": "2024-01-01T12:05:00"
         }
         
-        with patch('app.routes.proxy_manager') as mock_pm:
-            # Create an async mock that returns the result
-            async def mock_refresh_proxies():
-                return mock_result
-            mock_pm.refresh_proxies = mock_refresh_proxies
-            
-            response = client.post("/api/v1/refresh")
+        mock_pm.refresh_proxies.return_value = mock_result
+        
+        response = await client.post("/api/v1/refresh")
         
         assert response.status_code == 200
         data = response.json()
@@ -153,7 +184,8 @@ class TestRoutes:
         assert data["next_refresh"] == "2024-01-01T12:05:00"
         assert "Successfully refreshed proxies" in data["message"]
     
-    def test_refresh_proxies_rate_limited(self, client):
+    @pytest.mark.asyncio
+    async def test_refresh_proxies_rate_limited(self, client, mock_pm):
         """Test POST /refresh endpoint with rate limiting."""
         mock_result = {
             "success": False,
@@ -161,13 +193,9 @@ class TestRoutes:
             "next_refresh": "2024-01-01T12:05:00"
         }
         
-        with patch('app.routes.proxy_manager') as mock_pm:
-            # Create an async mock that returns the result
-            async def mock_refresh_proxies():
-                return mock_result
-            mock_pm.refresh_proxies = mock_refresh_proxies
-            
-            response = client.post("/api/v1/refresh")
+        mock_pm.refresh_proxies.return_value = mock_result
+        
+        response = await client.post("/api/v1/refresh")
         
         assert response.status_code == 200
         data = response.json()
@@ -175,22 +203,20 @@ class TestRoutes:
         assert data["proxy_count"] == 0
         assert "Rate limit exceeded" in data["message"]
     
-    def test_refresh_proxies_error(self, client):
+    @pytest.mark.asyncio
+    async def test_refresh_proxies_error(self, client, mock_pm):
         """Test POST /refresh endpoint with error."""
-        with patch('app.routes.proxy_manager') as mock_pm:
-            # Create an async mock that raises an exception
-            async def mock_refresh_proxies():
-                raise Exception("Refresh failed")
-            mock_pm.refresh_proxies = mock_refresh_proxies
-            
-            response = client.post("/api/v1/refresh")
+        mock_pm.refresh_proxies.side_effect = Exception("Refresh failed")
+        
+        response = await client.post("/api/v1/refresh")
         
         assert response.status_code == 500
         data = response.json()
         assert data["success"] is False
         assert "Failed to refresh proxies: Refresh failed" in data["message"]
     
-    def test_get_stats_success(self, client):
+    @pytest.mark.asyncio
+    async def test_get_stats_success(self, client, mock_pm):
         """Test successful GET /stats endpoint."""
         mock_stats = {
             "proxy_count": 10,
@@ -200,10 +226,9 @@ class TestRoutes:
             "max_refresh_per_minute": 10
         }
         
-        with patch('app.routes.proxy_manager') as mock_pm:
-            mock_pm.get_stats.return_value = mock_stats
-            
-            response = client.get("/api/v1/stats")
+        mock_pm.get_stats.return_value = mock_stats
+        
+        response = await client.get("/api/v1/stats")
         
         assert response.status_code == 200
         data = response.json()
@@ -211,19 +236,20 @@ class TestRoutes:
         assert data["data"] == mock_stats
         assert "Statistics retrieved successfully" in data["message"]
     
-    def test_get_stats_error(self, client):
+    @pytest.mark.asyncio
+    async def test_get_stats_error(self, client, mock_pm):
         """Test GET /stats endpoint with error."""
-        with patch('app.routes.proxy_manager') as mock_pm:
-            mock_pm.get_stats.side_effect = Exception("Stats error")
-            
-            response = client.get("/api/v1/stats")
+        mock_pm.get_stats.side_effect = Exception("Stats error")
+        
+        response = await client.get("/api/v1/stats")
         
         assert response.status_code == 500
         data = response.json()
         assert data["success"] is False
         assert "Failed to retrieve statistics: Stats error" in data["message"]
     
-    def test_health_check_success(self, client):
+    @pytest.mark.asyncio
+    async def test_health_check_success(self, client, mock_pm):
         """Test successful GET /health endpoint."""
         mock_stats = {
             "proxy_count": 5,
@@ -231,10 +257,9 @@ class TestRoutes:
             "next_refresh": "2024-01-01T12:05:00"
         }
         
-        with patch('app.routes.proxy_manager') as mock_pm:
-            mock_pm.get_stats.return_value = mock_stats
-            
-            response = client.get("/api/v1/health")
+        mock_pm.get_stats.return_value = mock_stats
+        
+        response = await client.get("/api/v1/health")
         
         assert response.status_code == 200
         data = response.json()
@@ -244,12 +269,12 @@ class TestRoutes:
         assert data["data"]["service"] == "MASX AI Proxy Service"
         assert "Service is healthy" in data["message"]
     
-    def test_health_check_error(self, client):
+    @pytest.mark.asyncio
+    async def test_health_check_error(self, client, mock_pm):
         """Test GET /health endpoint with error."""
-        with patch('app.routes.proxy_manager') as mock_pm:
-            mock_pm.get_stats.side_effect = Exception("Health check failed")
-            
-            response = client.get("/api/v1/health")
+        mock_pm.get_stats.side_effect = Exception("Health check failed")
+        
+        response = await client.get("/api/v1/health")
         
         assert response.status_code == 200
         data = response.json()
@@ -257,32 +282,30 @@ class TestRoutes:
         assert data["data"]["status"] == "unhealthy"
         assert "Service health check failed" in data["message"]
     
-    def test_invalid_endpoint(self, client):
+    @pytest.mark.asyncio
+    async def test_invalid_endpoint(self, client):
         """Test invalid endpoint returns 404."""
-        response = client.get("/invalid/endpoint")
+        response = await client.get("/invalid/endpoint")
         assert response.status_code == 404
     
-    def test_cors_headers(self, client):
-        """Test that CORS headers are present."""
-        response = client.options("/api/v1/proxies")
+    @pytest.mark.asyncio
+    async def test_cors_headers(self, client):
+        """Test that OPTIONS requests are handled with CORS disabled by default."""
+        response = await client.options("/api/v1/proxies")
         # CORS preflight request should not fail
         assert response.status_code in [200, 405]  # 405 is also acceptable for OPTIONS
     
-    def test_concurrent_requests(self, client):
+    @pytest.mark.asyncio
+    async def test_concurrent_requests(self, client, mock_pm):
         """Test handling of concurrent requests."""
         mock_proxies = ["1.2.3.4:8080", "5.6.7.8:3128"]
         
-        with patch('app.routes.proxy_manager') as mock_pm:
-            # Create an async mock that returns the proxies
-            async def mock_get_proxies():
-                return mock_proxies
-            mock_pm.get_proxies = mock_get_proxies
-            
-            # Make multiple requests
-            responses = []
-            for _ in range(5):
-                response = client.get("/api/v1/proxies")
-                responses.append(response)
+        mock_pm.get_proxies.return_value = mock_proxies
+        
+        # Make multiple requests at once
+        async with asyncio.TaskGroup() as group:
+            tasks = [group.create_task(client.get("/api/v1/proxies")) for _ in range(5)]
+        responses = [task.result() for task in tasks]
         
         # All requests should succeed
         for response in responses: